@@ -0,0 +1,284 @@
+import argparse
+import json
+import platform
+import socket
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import redis
+
+from cluster_slots import ShardRouter, write_grouped
+from compare_indexes import compare_indexes, get_indexes
+from compare_keys import compare_keys, get_keys_by_pattern
+from migrate_index_redisvl import cleanup_target_database, run_migration, wait_for_indexing
+from redis_vecotr_hash_search import INDEX_CONFIGS
+
+def get_redis_connection(host: str, port: int) -> redis.Redis:
+    """Create and return a Redis connection."""
+    return redis.Redis(
+        host=host,
+        port=port,
+        decode_responses=True
+    )
+
+def parse_address(address: str) -> Tuple[str, int]:
+    """Parse a host:port address."""
+    host, _, port = address.rpartition(':')
+    return host or 'localhost', int(port)
+
+def start_local_redis(server: str, port: int, module: str = None, timeout: float = 10.0) -> subprocess.Popen:
+    """Launch a throwaway Redis with the search module on port and wait until it answers PING.
+
+    Refuses to start when something already listens on port, and checks that the server
+    answering is the one launched, so the benchmark never flushes a database it did not create.
+    """
+    try:
+        socket.create_connection(('localhost', port), timeout=1).close()
+    except OSError:
+        pass  # Nothing listening, the port is free
+    else:
+        raise Exception(f"Port {port} is already in use, stop that server or pick another --source-port/--target-port")
+
+    command = [server, '--port', str(port), '--save', '', '--appendonly', 'no']
+    if module:
+        command.extend(['--loadmodule', module])
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except OSError as e:
+        raise Exception(f"Could not launch {server}, install Redis Stack or pass --server/--module: {e}")
+
+    client = get_redis_connection('localhost', port)
+    deadline = time.time() + timeout
+    try:
+        while True:
+            if process.poll() is not None:
+                raise Exception(f"{server} exited with code {process.returncode} on port {port}")
+            try:
+                client.ping()
+                break
+            except redis.ConnectionError:
+                if time.time() > deadline:
+                    raise Exception(f"{server} did not start on port {port} within {timeout} seconds")
+                time.sleep(0.1)
+
+        process_id = client.info('server').get('process_id')
+        if process_id != process.pid:
+            raise Exception(f"Port {port} is answered by process {process_id}, not the launched {server} "
+                            f"(pid {process.pid})")
+        return process
+    except BaseException:
+        process.terminate()
+        process.wait()
+        raise
+    finally:
+        client.close()
+
+def scale_schema(schema: List[str], dims: int) -> List[str]:
+    """Return a copy of an INDEX_CONFIGS schema with the vector dimension replaced by dims."""
+    schema = list(schema)
+    for i, token in enumerate(schema[:-1]):
+        if token == 'DIM':
+            schema[i + 1] = str(dims)
+    return schema
+
+def schema_fields(schema: List[str]) -> List[Tuple[str, str]]:
+    """Return (name, type) for every field of an FT.CREATE schema argument list."""
+    fields = []
+    i = 0
+    while i < len(schema):
+        name, field_type = schema[i], schema[i + 1]
+        fields.append((name, field_type))
+        if field_type == 'VECTOR':
+            i += 4 + int(schema[i + 3])  # name, VECTOR, algorithm, nargs, attributes...
+        else:
+            i += 2
+        while i < len(schema) and schema[i] == 'SORTABLE':
+            i += 1
+    return fields
+
+def seed_source(client: redis.Redis, index_name: str, config: Dict[str, Any], num_docs: int, dims: int,
+                batch_size: int = 500) -> None:
+    """Create an index shaped like config on the source and load num_docs synthetic documents.
+
+    Destructive: the index and every key under its prefix are deleted from the source first.
+    """
+    schema = scale_schema(config['schema'], dims)
+    cleanup_target_database(client, index_name, config['prefix'])
+    client.execute_command('FT.CREATE', index_name, 'ON', 'HASH', 'PREFIX', '1', config['prefix'], 'SCHEMA', *schema)
+
+    fields = schema_fields(schema)
+    rng = np.random.default_rng(0)
+    router = ShardRouter(client)
+    try:
+        for start in range(0, num_docs, batch_size):
+            count = min(batch_size, num_docs - start)
+            embeddings = rng.standard_normal((count, dims)).astype(np.float32)
+            items = []
+            for offset in range(count):
+                doc_id = start + offset
+                document = {}
+                for name, field_type in fields:
+                    if field_type == 'VECTOR':
+                        document[name] = embeddings[offset].tobytes()
+                    elif field_type == 'NUMERIC':
+                        document[name] = doc_id
+                    else:
+                        document[name] = f"{name}_{doc_id % 100}"
+                items.append((f"{config['prefix']}{doc_id}", document))
+            write_grouped(router, items, lambda pipe, key, document: pipe.hset(key, mapping=document))
+    finally:
+        router.close()
+    wait_for_indexing(client, index_name, num_docs)
+
+def benchmark_index(source_client: redis.Redis, target_client: redis.Redis, index_name: str, num_docs: int,
+                    dims: int, replication: str) -> Dict[str, Any]:
+    """Seed one index, migrate it and time every stage including the comparison passes."""
+    config = INDEX_CONFIGS[index_name]
+    stages = {}
+
+    start_time = time.perf_counter()
+    seed_source(source_client, index_name, config, num_docs, dims)
+    stages['seed_source'] = time.perf_counter() - start_time
+
+    migration_timings = {}
+    start_time = time.perf_counter()
+    if not run_migration(source_client, target_client, index_name, replication=replication, timings=migration_timings):
+        raise Exception(f"Migration of {index_name} failed")
+    stages['run_migration'] = time.perf_counter() - start_time
+    stages.update({f"run_migration.{stage}": duration for stage, duration in migration_timings.items()})
+
+    start_time = time.perf_counter()
+    wait_for_indexing(target_client, index_name, num_docs)
+    stages['target_indexing'] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    pattern = f"{config['prefix']}*"
+    only_in_source, only_in_target, in_both = compare_keys(
+        get_keys_by_pattern(source_client, pattern),
+        get_keys_by_pattern(target_client, pattern)
+    )
+    stages['compare_keys'] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    missing_indexes, _, _ = compare_indexes(get_indexes(source_client), get_indexes(target_client))
+    stages['compare_indexes'] = time.perf_counter() - start_time
+
+    replication_time = migration_timings.get('replication', 0)
+    return {
+        'index': index_name,
+        'docs': num_docs,
+        'dims': dims,
+        'stages': stages,
+        'replication_docs_per_second': num_docs / replication_time if replication_time else None,
+        'keys_only_in_source': len(only_in_source),
+        'keys_only_in_target': len(only_in_target),
+        'verified': not only_in_source and not only_in_target and len(in_both) == num_docs
+                    and index_name not in missing_indexes,
+    }
+
+def get_git_commit() -> str:
+    """Return the commit the benchmark ran against, if available."""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description='Benchmark an end-to-end index migration between local Redis instances')
+    parser.add_argument('--docs', type=int, default=10000, help='Documents to seed per index')
+    parser.add_argument('--dims', type=int, default=128, help='Vector dimension of the seeded embeddings')
+    parser.add_argument('--indexes', default=','.join(INDEX_CONFIGS),
+                        help='Comma separated INDEX_CONFIGS shapes to benchmark')
+    parser.add_argument('--replication', choices=['pipeline', 'riot'], default='pipeline',
+                        help='Replication used by run_migration')
+    parser.add_argument('--repeat', type=int, default=1, help='Number of runs per index')
+    parser.add_argument('--source', help='host:port of a running source instead of launching one '
+                                         '(DESTROYS the benchmarked indexes and their keys, needs --allow-flush)')
+    parser.add_argument('--target', help='host:port of a running target instead of launching one '
+                                         '(DESTROYS the benchmarked indexes and their keys, needs --allow-flush)')
+    parser.add_argument('--allow-flush', action='store_true',
+                        help='Allow dropping the INDEX_CONFIGS indexes and deleting their prefixes '
+                             '(vector:doc:*, ...) on --source/--target')
+    parser.add_argument('--server', default='redis-stack-server', help='Redis server binary to launch')
+    parser.add_argument('--module', help='Search module to load into the launched servers (e.g. redisearch.so)')
+    parser.add_argument('--source-port', type=int, default=16379, help='Port of the launched source')
+    parser.add_argument('--target-port', type=int, default=16380, help='Port of the launched target')
+    parser.add_argument('--output', help='JSON results file (defaults to benchmark_<timestamp>.json)')
+    args = parser.parse_args()
+
+    started_at = datetime.now(timezone.utc)
+    output = args.output or f"benchmark_{started_at.strftime('%Y%m%d-%H%M%S')}.json"
+    index_names = [name for name in args.indexes.split(',') if name]
+    unknown = [name for name in index_names if name not in INDEX_CONFIGS]
+    if unknown:
+        parser.error(f"Unknown index shapes: {', '.join(unknown)}")
+    if (args.source or args.target) and not args.allow_flush:
+        parser.error("--source/--target point at existing databases whose benchmarked indexes and keys "
+                     "(vector:doc:*, ...) would be deleted, pass --allow-flush to confirm")
+
+    processes = []
+    source_client = target_client = None
+    try:
+        # Launch throwaway servers unless existing ones were given
+        endpoints = []
+        for address, port in ((args.source, args.source_port), (args.target, args.target_port)):
+            if address:
+                endpoints.append(parse_address(address))
+            else:
+                print(f"Starting {args.server} on port {port}...")
+                processes.append(start_local_redis(args.server, port, args.module))
+                endpoints.append(('localhost', port))
+        source_client = get_redis_connection(*endpoints[0])
+        target_client = get_redis_connection(*endpoints[1])
+
+        results = []
+        for index_name in index_names:
+            for run in range(args.repeat):
+                print(f"\nBenchmarking {index_name} (run {run + 1}/{args.repeat}, {args.docs} docs, dim {args.dims})...")
+                result = benchmark_index(source_client, target_client, index_name, args.docs, args.dims,
+                                         args.replication)
+                result['run'] = run + 1
+                results.append(result)
+
+        print("\nBenchmark Results:")
+        print("-" * 50)
+        for result in results:
+            print(f"\n{result['index']} run {result['run']} (verified: {result['verified']}):")
+            for stage, duration in result['stages'].items():
+                print(f"- {stage}: {duration:.3f} seconds")
+            if result['replication_docs_per_second']:
+                print(f"- replication throughput: {result['replication_docs_per_second']:.0f} docs/second")
+
+        report = {
+            'started_at': started_at.isoformat(),
+            'git_commit': get_git_commit(),
+            'python': platform.python_version(),
+            'redis_version': source_client.info('server').get('redis_version'),
+            'parameters': {
+                'docs': args.docs,
+                'dims': args.dims,
+                'indexes': index_names,
+                'replication': args.replication,
+                'repeat': args.repeat,
+            },
+            'results': results,
+        }
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {output}")
+
+    finally:
+        # Close connections and stop launched servers
+        for client in (source_client, target_client):
+            if client is not None:
+                client.close()
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import redis
+from redis.crc import REDIS_CLUSTER_HASH_SLOTS, key_slot
+from redis.exceptions import AskError, ClusterDownError, MovedError, TryAgainError
+
+# Replies a cluster node gives while a slot is owned elsewhere or being migrated
+REDIRECT_ERRORS = (MovedError, AskError, TryAgainError, ClusterDownError)
+
+# Errors after which a write should be retried against a refreshed slot map
+TOPOLOGY_ERRORS = REDIRECT_ERRORS + (redis.ConnectionError, redis.TimeoutError)
+
+def hash_slot(key: Any) -> int:
+    """Return the cluster hash slot of a key, honouring {hash tags}."""
+    if isinstance(key, str):
+        key = key.encode()
+    return key_slot(key)
+
+def hash_tag(key: Any) -> bytes:
+    """Return the part of a key that is hashed: the first non-empty {tag}, or the whole key."""
+    if isinstance(key, str):
+        key = key.encode()
+    start = key.find(b"{")
+    if start > -1:
+        end = key.find(b"}", start + 1)
+        if end > start + 1:
+            return key[start + 1:end]
+    return key
+
+def slot_local_key(key: Any, namespace: str) -> bytes:
+    """Return a key in namespace that hashes to the same slot as key, so RENAME between them is allowed.
+
+    Raises ValueError for the rare untagged key containing '}', which cannot be wrapped in a hash tag.
+    """
+    if isinstance(key, str):
+        key = key.encode()
+    # Only the first {tag} is hashed, so appending the original key keeps the slot and makes it unique
+    local_key = namespace.encode() + b":{" + hash_tag(key) + b"}:" + key
+    if hash_slot(local_key) != hash_slot(key):
+        raise ValueError(f"Cannot build a same-slot key for {key!r}")
+    return local_key
+
+def clone_client(client: redis.Redis, **overrides: Any) -> redis.Redis:
+    """Return a client with its own connection pool, using the connection settings of client plus overrides.
+
+    Pool kwargs are not Redis() constructor kwargs (and ssl=True only survives as the
+    connection class), so the new client is built from a ConnectionPool.
+    """
+    pool = client.connection_pool
+    connection_kwargs = dict(pool.connection_kwargs)
+    connection_kwargs.update(overrides)
+    if "host" in overrides and "orig_host_address" in connection_kwargs:
+        connection_kwargs["orig_host_address"] = overrides["host"]
+    return redis.Redis(connection_pool=redis.ConnectionPool(connection_class=pool.connection_class, **connection_kwargs))
+
+def get_slot_map(client: redis.Redis) -> Optional[List[Tuple[int, int, Tuple[str, int]]]]:
+    """Return (start, end, (host, port)) for every slot range, or None when the server is not clustered."""
+    try:
+        slots = client.execute_command('CLUSTER SLOTS')
+    except redis.ResponseError:
+        # Cluster support disabled: standalone Redis or a proxy that routes keys itself
+        return None
+
+    default_host = client.connection_pool.connection_kwargs.get("host")
+    slot_map = []
+    for slot_range in slots:
+        start, end, master = slot_range[0], slot_range[1], slot_range[2]
+        host = master[0].decode() if isinstance(master[0], bytes) else master[0]
+        # An empty host means "the node you are connected to"
+        slot_map.append((int(start), int(end), (host or default_host, int(master[1]))))
+    return slot_map
+
+class ShardRouter:
+    """Route keys of a (possibly) clustered database to a client per owning shard.
+
+    Against a standalone database every key routes to the original client, so the
+    same code path serves both deployments.
+    """
+
+    def __init__(self, client: redis.Redis):
+        self.client = client
+        self.node_clients: Dict[Tuple[str, int], redis.Redis] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.slot_owners: Optional[List[Tuple[str, int]]] = None
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Reload the slot map, e.g. after a MOVED reply or a failover."""
+        slot_map = get_slot_map(self.client)
+        if slot_map is None:
+            self.slot_owners = None
+            return
+        slot_owners = [None] * REDIS_CLUSTER_HASH_SLOTS
+        for start, end, node in slot_map:
+            for slot in range(start, end + 1):
+                slot_owners[slot] = node
+        self.slot_owners = slot_owners
+
+    @property
+    def is_clustered(self) -> bool:
+        return self.slot_owners is not None
+
+    def nodes(self) -> List[Optional[Tuple[str, int]]]:
+        """Return every master node, or [None] for a standalone database."""
+        if not self.is_clustered:
+            return [None]
+        return sorted({node for node in self.slot_owners if node is not None})
+
+    def node_for_key(self, key: Any) -> Optional[Tuple[str, int]]:
+        if not self.is_clustered:
+            return None
+        return self.slot_owners[hash_slot(key)]
+
+    def client_for_node(self, node: Optional[Tuple[str, int]]) -> redis.Redis:
+        """Return a client connected directly to node, reusing one connection pool per shard."""
+        if node is None:
+            return self.client
+        if node not in self.node_clients:
+            self.node_clients[node] = clone_client(self.client, host=node[0], port=node[1])
+        return self.node_clients[node]
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Thread pool that runs the per-shard pipelines of this router in parallel."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=len(self.nodes()))
+        return self._executor
+
+    def group_by_node(self, items: List[Tuple[Any, Any]]) -> Dict[Optional[Tuple[str, int]], List[Tuple[Any, Any]]]:
+        """Split (key, value) items into one batch per owning shard."""
+        groups: Dict[Optional[Tuple[str, int]], List[Tuple[Any, Any]]] = {}
+        for item in items:
+            groups.setdefault(self.node_for_key(item[0]), []).append(item)
+        return groups
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        for node_client in self.node_clients.values():
+            node_client.close()
+        self.node_clients = {}
+
+def _execute_group(client: redis.Redis, items: List[Tuple[Any, Any]], write: Callable[[Any, Any, Any], None],
+                   asking: bool = False, ignore_error: Callable[[Exception], bool] = None
+                   ) -> Tuple[List[Tuple[Tuple[Any, Any], Exception]], List[Tuple[Any, Any]]]:
+    """Run one pipeline for a single shard.
+
+    Returns (item, error) for the items that need to be retried, and the items
+    skipped because they failed with an error accepted by ignore_error.
+
+    With asking=True every command is preceded by ASKING, as required after an ASK
+    redirect to a slot that is still being imported by the node.
+    """
+    pipe = client.pipeline(transaction=False)
+    command_counts = []
+    for key, value in items:
+        recorder = client.pipeline(transaction=False)
+        write(recorder, key, value)
+        for args, options in recorder.command_stack:
+            if asking:
+                pipe.execute_command('ASKING')
+            pipe.execute_command(*args, **options)
+        command_counts.append(len(recorder.command_stack))
+
+    try:
+        results = pipe.execute(raise_on_error=False)
+    except (redis.ConnectionError, redis.TimeoutError) as e:
+        # The shard went away (failover, resharding), retry the whole batch against the new owner
+        print(f"Lost connection to shard while writing {len(items)} keys: {e}")
+        return [(item, e) for item in items], []
+
+    if asking:
+        results = results[1::2]  # Drop the ASKING replies
+    retry = []
+    skipped = []
+    position = 0
+    for item, count in zip(items, command_counts):
+        item_results = results[position:position + count]
+        position += count
+        redirects = [result for result in item_results if isinstance(result, REDIRECT_ERRORS)]
+        if redirects:
+            retry.append((item, redirects[0]))
+            continue
+        errors = [result for result in item_results if isinstance(result, Exception)]
+        if errors and ignore_error is not None and all(ignore_error(error) for error in errors):
+            skipped.append(item)
+        elif errors:
+            raise errors[0]
+    return retry, skipped
+
+def write_grouped(router: ShardRouter, items: List[Tuple[Any, Any]], write: Callable[[Any, Any, Any], None],
+                  max_attempts: int = 5, ignore_error: Callable[[Exception], bool] = None) -> List[Tuple[Any, Any]]:
+    """Write (key, value) items with one pipeline per owning shard, shards in parallel.
+
+    write(pipe, key, value) queues the commands for a single key. Keys answered with
+    MOVED are resent to the new owner and the slot map is refreshed; keys answered
+    with ASK are resent with ASKING to the importing node. TRYAGAIN, CLUSTERDOWN and
+    dropped connections are retried with backoff after refreshing the slot map, so
+    a topology change does not fail the run.
+
+    Other errors are raised, unless ignore_error accepts them; the items skipped that
+    way are returned.
+    """
+    skipped = []
+    # (item, node, asking) for every key still to be written
+    pending = [(item, router.node_for_key(item[0]), False) for item in items]
+    for attempt in range(max_attempts):
+        groups: Dict[Tuple[Optional[Tuple[str, int]], bool], List[Tuple[Any, Any]]] = {}
+        for item, node, asking in pending:
+            groups.setdefault((node, asking), []).append(item)
+
+        if len(groups) == 1:
+            (node, asking), group = next(iter(groups.items()))
+            failed, group_skipped = _execute_group(router.client_for_node(node), group, write, asking, ignore_error)
+            skipped.extend(group_skipped)
+        else:
+            futures = [
+                router.executor.submit(_execute_group, router.client_for_node(node), group, write, asking,
+                                       ignore_error)
+                for (node, asking), group in groups.items()
+            ]
+            failed = []
+            for future in futures:
+                group_failed, group_skipped = future.result()
+                failed.extend(group_failed)
+                skipped.extend(group_skipped)
+
+        if not failed:
+            return skipped
+
+        # MOVED and ASK name the node to use, anything else waits for the cluster to settle
+        redirected = [(item, (e.host, int(e.port)), not isinstance(e, MovedError))
+                      for item, e in failed if isinstance(e, AskError)]
+        unsettled = [item for item, e in failed if not isinstance(e, AskError)]
+        if unsettled:
+            print(f"Cluster topology changing, retrying {len(unsettled)} keys (attempt {attempt + 1}/{max_attempts})")
+            time.sleep(0.1 * (2 ** attempt))
+        if unsettled or any(isinstance(e, MovedError) for _, e in failed):
+            router.refresh()
+        pending = redirected + [(item, router.node_for_key(item[0]), False) for item in unsettled]
+
+    raise Exception(f"Failed to write {len(pending)} keys after {max_attempts} attempts")
+
+def read_grouped(router: ShardRouter, keys: List[Any], read: Callable[[Any, Any], None]) -> Dict[Any, Any]:
+    """Run read(pipe, key) for every key with one pipeline per owning shard and return {key: reply}.
+
+    Error replies (e.g. WRONGTYPE) are returned as exception objects instead of raised.
+    """
+    replies = {}
+    for node, group in router.group_by_node([(key, None) for key in keys]).items():
+        pipe = router.client_for_node(node).pipeline(transaction=False)
+        for key, _ in group:
+            read(pipe, key)
+        for (key, _), reply in zip(group, pipe.execute(raise_on_error=False)):
+            replies[key] = reply
+    return replies
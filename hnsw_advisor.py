@@ -0,0 +1,323 @@
+import argparse
+import itertools
+import json
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+import redis
+
+from cluster_slots import ShardRouter, write_grouped
+from migrate_index_redisvl import (
+    VECTOR_DTYPES,
+    get_binary_client,
+    get_index_definition,
+    get_index_prefix,
+    get_vector_fields,
+    wait_for_indexing,
+)
+
+def get_redis_connection(host: str, port: int) -> redis.Redis:
+    """Create and return a Redis connection."""
+    return redis.Redis(
+        host=host,
+        port=port,
+        decode_responses=True
+    )
+
+def sample_embeddings(client: redis.Redis, prefix: str, field_name: str, dtype: Any, dims: int,
+                      sample_size: int, batch_size: int = 500) -> np.ndarray:
+    """Scan documents under prefix on every shard and return up to sample_size well-formed embeddings as a 2-D array.
+
+    Each shard contributes an equal share of the sample, so a clustered source is not
+    sampled from a single shard only.
+    """
+    binary_client = get_binary_client(client)
+    router = ShardRouter(binary_client)
+    expected_size = dims * np.dtype(dtype).itemsize
+    blobs = []
+    try:
+        nodes = router.nodes()
+        for position, node in enumerate(nodes):
+            node_client = router.client_for_node(node)
+            # Leftover quota of shards with fewer documents carries over to the next ones
+            node_quota = (sample_size - len(blobs)) // (len(nodes) - position)
+            node_blobs = []
+            cursor = 0
+            while len(node_blobs) < node_quota:
+                cursor, keys = node_client.scan(cursor, match=f"{prefix}*", count=batch_size)
+                if keys:
+                    pipe = node_client.pipeline(transaction=False)
+                    for key in keys:
+                        pipe.hget(key, field_name)
+                    # Skip missing, malformed or non-hash documents, they would only skew the benchmark
+                    node_blobs.extend(blob for blob in pipe.execute(raise_on_error=False)
+                                      if isinstance(blob, bytes) and len(blob) == expected_size)
+                if cursor == 0:
+                    break
+            blobs.extend(node_blobs[:node_quota])
+    finally:
+        router.close()
+        binary_client.close()
+
+    vectors = np.frombuffer(b"".join(blobs[:sample_size]), dtype=dtype).reshape(-1, dims)
+    return vectors[np.isfinite(vectors.astype(np.float64)).all(axis=1)]
+
+def brute_force_neighbors(base: np.ndarray, queries: np.ndarray, k: int, distance_metric: str) -> np.ndarray:
+    """Return the exact top-k neighbour row indices of each query, computed with NumPy."""
+    base = base.astype(np.float32)
+    queries = queries.astype(np.float32)
+    if distance_metric == "COSINE":
+        base = base / np.maximum(np.linalg.norm(base, axis=1, keepdims=True), 1e-12)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        distances = -(queries @ base.T)
+    elif distance_metric == "IP":
+        distances = -(queries @ base.T)
+    else:  # L2
+        distances = (
+            (queries ** 2).sum(axis=1)[:, None]
+            - 2 * (queries @ base.T)
+            + (base ** 2).sum(axis=1)[None, :]
+        )
+    k = min(k, base.shape[0])
+    return np.argpartition(distances, k - 1, axis=1)[:, :k]
+
+def build_scratch_index(client: redis.Redis, scratch_name: str, field: Dict[str, Any], base: np.ndarray,
+                        m: int, ef_construction: int, batch_size: int = 500) -> Dict[str, float]:
+    """Create an HNSW scratch index, load the base vectors and return build time and index memory."""
+    prefix = f"{scratch_name}:"
+    client.execute_command(
+        'FT.CREATE', scratch_name, 'ON', 'HASH', 'PREFIX', '1', prefix, 'SCHEMA',
+        field["attribute"], 'VECTOR', 'HNSW', '10',
+        'TYPE', field.get("data_type", "FLOAT32"),
+        'DIM', base.shape[1],
+        'DISTANCE_METRIC', field.get("distance_metric", "COSINE"),
+        'M', m,
+        'EF_CONSTRUCTION', ef_construction
+    )
+
+    start_time = time.perf_counter()
+    router = ShardRouter(client)
+    try:
+        for start in range(0, len(base), batch_size):
+            items = [(f"{prefix}{i}", base[i].tobytes()) for i in range(start, min(start + batch_size, len(base)))]
+            write_grouped(router, items, lambda pipe, key, blob: pipe.hset(key, field["attribute"], blob))
+    finally:
+        router.close()
+    info = wait_for_indexing(client, scratch_name, len(base))
+    build_time = time.perf_counter() - start_time
+
+    return {
+        "build_time_s": build_time,
+        "memory_mb": float(info.get("vector_index_sz_mb", 0) or 0),
+    }
+
+def measure_queries(client: redis.Redis, scratch_name: str, field_name: str, queries: np.ndarray,
+                    truth: np.ndarray, k: int, ef_runtime: int) -> Dict[str, float]:
+    """Run one KNN query per query vector and return latency percentiles and recall@k."""
+    prefix = f"{scratch_name}:"
+    latencies = []
+    hits = 0
+    for query, expected in zip(queries, truth):
+        start_time = time.perf_counter()
+        result = client.execute_command(
+            'FT.SEARCH', scratch_name,
+            f'*=>[KNN {k} @{field_name} $BLOB EF_RUNTIME {ef_runtime}]',
+            'PARAMS', 2, 'BLOB', query.tobytes(),
+            'NOCONTENT',
+            'LIMIT', 0, k,
+            'DIALECT', 2
+        )
+        latencies.append(time.perf_counter() - start_time)
+        found = {int(key[len(prefix):]) for key in result[1:]}
+        hits += len(found & set(expected.tolist()))
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "p50_latency_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_latency_ms": float(np.percentile(latencies_ms, 95)),
+        "recall": hits / float(truth.size),
+    }
+
+def drop_scratch_index(client: redis.Redis, scratch_name: str) -> None:
+    """Drop a scratch index together with its documents, if it exists."""
+    try:
+        client.execute_command('FT.DROPINDEX', scratch_name, 'DD')
+    except redis.RedisError as e:
+        # Nothing to drop is the normal case before a build
+        if "unknown index" not in str(e).lower() and "no such index" not in str(e).lower():
+            print(f"Error dropping scratch index {scratch_name}: {e}")
+
+def sweep_hnsw_parameters(source_client: redis.Redis, target_client: redis.Redis, index_name: str,
+                          field_name: str = None, sample_size: int = 10000, num_queries: int = 100, k: int = 10,
+                          m_values: List[int] = (8, 16, 32, 64),
+                          ef_construction_values: List[int] = (100, 200, 400),
+                          ef_runtime_values: List[int] = (10, 50, 100, 200)) -> List[Dict[str, Any]]:
+    """Benchmark every M / EF_CONSTRUCTION / EF_RUNTIME combination on a sample of the source index.
+
+    The embeddings are sampled from the source and loaded into scratch indexes on the
+    target, so the measurements reflect the hardware the migrated index will run on.
+    Every result records the vector field it was measured on.
+    """
+    index_info = get_index_definition(source_client, index_name)
+    if not index_info:
+        raise Exception("Failed to retrieve index definition")
+    prefix = get_index_prefix(index_info)
+    if not prefix:
+        raise Exception("No prefix found in index definition")
+
+    vector_fields = get_vector_fields(index_info)
+    if field_name:
+        vector_fields = [f for f in vector_fields if f.get("attribute") == field_name]
+    if not vector_fields:
+        raise Exception(f"No vector field {field_name or ''} found in index {index_name}")
+    field = vector_fields[0]
+
+    data_type = str(field.get("data_type", "FLOAT32")).upper()
+    if data_type not in VECTOR_DTYPES:
+        raise Exception(f"Unsupported vector data type {data_type}")
+    dims = int(field.get("dim", 0))
+    distance_metric = str(field.get("distance_metric", "COSINE")).upper()
+
+    print(f"Sampling up to {sample_size + num_queries} embeddings from {index_name}.{field['attribute']}...")
+    vectors = sample_embeddings(source_client, prefix, field["attribute"], VECTOR_DTYPES[data_type], dims,
+                                sample_size + num_queries)
+    if len(vectors) <= num_queries:
+        raise Exception(f"Only {len(vectors)} usable embeddings found, need more than {num_queries}")
+
+    # Hold the queries out of the indexed set so they behave like real traffic
+    rng = np.random.default_rng(0)
+    vectors = vectors[rng.permutation(len(vectors))]
+    queries, base = vectors[:num_queries], vectors[num_queries:]
+    truth = brute_force_neighbors(base, queries, k, distance_metric)
+    print(f"Indexing {len(base)} vectors, querying with {len(queries)} held-out vectors (k={k})")
+
+    results = []
+    for m, ef_construction in itertools.product(m_values, ef_construction_values):
+        scratch_name = f"__hnsw_advisor:{index_name}:m{m}:efc{ef_construction}"
+        drop_scratch_index(target_client, scratch_name)
+        try:
+            build = build_scratch_index(target_client, scratch_name, field, base, m, ef_construction)
+            for ef_runtime in ef_runtime_values:
+                query_stats = measure_queries(target_client, scratch_name, field["attribute"], queries, truth,
+                                              truth.shape[1], ef_runtime)
+                result = {"field": field["attribute"], "m": m, "ef_construction": ef_construction,
+                          "ef_runtime": ef_runtime}
+                result.update(build)
+                result.update(query_stats)
+                results.append(result)
+                print(f"M={m} EF_CONSTRUCTION={ef_construction} EF_RUNTIME={ef_runtime}: "
+                      f"recall={result['recall']:.3f} p50={result['p50_latency_ms']:.2f}ms "
+                      f"build={result['build_time_s']:.2f}s memory={result['memory_mb']:.2f}MB")
+        finally:
+            drop_scratch_index(target_client, scratch_name)
+
+    return results
+
+def pareto_front(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Return the results not dominated on build time, memory, p50 latency (lower is better) and recall (higher is better)."""
+    def as_costs(result):
+        return (result["build_time_s"], result["memory_mb"], result["p50_latency_ms"], -result["recall"])
+
+    front = []
+    for candidate in results:
+        costs = as_costs(candidate)
+        dominated = False
+        for other in results:
+            other_costs = as_costs(other)
+            if all(o <= c for o, c in zip(other_costs, costs)) and any(o < c for o, c in zip(other_costs, costs)):
+                dominated = True
+                break
+        if not dominated:
+            front.append(candidate)
+    return front
+
+def recommend(results: List[Dict[str, Any]], target_recall: float = 0.95) -> Dict[str, Any]:
+    """Pick the fastest Pareto-optimal setting reaching target_recall, or the most accurate one if none does."""
+    front = pareto_front(results)
+    eligible = [r for r in front if r["recall"] >= target_recall]
+    if eligible:
+        return min(eligible, key=lambda r: (r["p50_latency_ms"], r["memory_mb"], r["build_time_s"]))
+    return max(front, key=lambda r: (r["recall"], -r["p50_latency_ms"]))
+
+def parse_int_list(value: str) -> List[int]:
+    """Parse a comma separated list of integers."""
+    return [int(v) for v in value.split(',') if v.strip()]
+
+def main():
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description='Recommend HNSW parameters for a vector index before migrating it')
+    parser.add_argument('index_name', help='Name of the source index')
+    parser.add_argument('--field', help='Vector field to tune (defaults to the first vector field)')
+    parser.add_argument('--sample-size', type=int, default=10000, help='Number of embeddings to index')
+    parser.add_argument('--queries', type=int, default=100, help='Number of held-out query vectors')
+    parser.add_argument('-k', type=int, default=10, help='Number of neighbours for recall@k')
+    parser.add_argument('--m', type=parse_int_list, default=[8, 16, 32, 64], help='M values to sweep')
+    parser.add_argument('--ef-construction', type=parse_int_list, default=[100, 200, 400],
+                        help='EF_CONSTRUCTION values to sweep')
+    parser.add_argument('--ef-runtime', type=parse_int_list, default=[10, 50, 100, 200],
+                        help='EF_RUNTIME values to sweep')
+    parser.add_argument('--target-recall', type=float, default=0.95, help='Minimum acceptable recall@k')
+    parser.add_argument('--output', help='Write all measurements and the recommendation to this JSON file')
+    args = parser.parse_args()
+
+    # Source Redis connection (your original cluster)
+    source_client = get_redis_connection(
+        host='node1.cluster-kmiller.ps-redis.com',
+        port=17120
+    )
+
+    # Target Redis connection (your new cluster)
+    target_client = get_redis_connection(
+        host='node1.cluster-kmiller.ps-redis.com',
+        port=12416
+    )
+
+    try:
+        results = sweep_hnsw_parameters(
+            source_client, target_client, args.index_name,
+            field_name=args.field,
+            sample_size=args.sample_size,
+            num_queries=args.queries,
+            k=args.k,
+            m_values=args.m,
+            ef_construction_values=args.ef_construction,
+            ef_runtime_values=args.ef_runtime
+        )
+
+        front = pareto_front(results)
+        best = recommend(results, args.target_recall)
+        vector_params = {
+            best["field"]: {
+                "algorithm": "HNSW",
+                "m": best["m"],
+                "ef_construction": best["ef_construction"],
+                "ef_runtime": best["ef_runtime"]
+            }
+        }
+
+        print("\nPareto-optimal settings:")
+        print("-" * 50)
+        for r in sorted(front, key=lambda r: -r["recall"]):
+            print(f"- M={r['m']} EF_CONSTRUCTION={r['ef_construction']} EF_RUNTIME={r['ef_runtime']}: "
+                  f"recall={r['recall']:.3f} p50={r['p50_latency_ms']:.2f}ms p95={r['p95_latency_ms']:.2f}ms "
+                  f"build={r['build_time_s']:.2f}s memory={r['memory_mb']:.2f}MB")
+
+        print("\nRecommendation:")
+        if best["recall"] < args.target_recall:
+            print(f"No setting reached recall {args.target_recall}, using the most accurate one")
+        print(f"vector_params = {vector_params}")
+        print("Pass these to run_migration(..., vector_params=vector_params) when recreating the index")
+
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump({"results": results, "pareto_front": front, "vector_params": vector_params}, f, indent=2)
+            print(f"Results written to {args.output}")
+
+    finally:
+        # Close connections
+        source_client.close()
+        target_client.close()
+
+if __name__ == '__main__':
+    main()
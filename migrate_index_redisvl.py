@@ -1,8 +1,12 @@
+import time
 from redis import Redis
+from redis.exceptions import MovedError
+import numpy as np
 from redisvl.schema import IndexSchema
 from redisvl.index import SearchIndex
 from redis.commands.search.field import TextField, NumericField, VectorField
 from redisvl.query import VectorQuery
+from cluster_slots import TOPOLOGY_ERRORS, ShardRouter, clone_client, slot_local_key, write_grouped
 
 # Helper function to retrieve index information from Redis
 def get_index_definition(client, index_name):
@@ -12,6 +16,17 @@ def get_index_definition(client, index_name):
         print(f"Error retrieving index {index_name}: {e}")
         return None
 
+def wait_for_indexing(client, index_name, num_docs, timeout=600.0):
+    """Poll FT.INFO until the index has caught up with num_docs documents and return the final info"""
+    deadline = time.time() + timeout
+    while True:
+        info = client.ft(index_name).info()
+        if int(info.get("num_docs", 0)) >= num_docs and str(info.get("indexing", 0)) in ("0", "0.0"):
+            return info
+        if time.time() > deadline:
+            raise Exception(f"Timed out waiting for index {index_name} to finish indexing")
+        time.sleep(0.05)
+
 def cleanup_target_database(target_client, index_name, prefix):
     """Clean up target database by removing existing index and matching keys"""
     try:
@@ -22,27 +37,96 @@ def cleanup_target_database(target_client, index_name, prefix):
         except Exception as e:
             print(f"No existing index {index_name} to delete: {e}")
 
-        # Delete all keys matching the prefix
+        # Delete all keys matching the prefix, scanning every shard and deleting
+        # with one pipeline per owning shard so a clustered target never sees
+        # cross-slot commands
         pattern = f"{prefix}*"
-        cursor = 0
-        while True:
-            cursor, keys = target_client.scan(cursor, match=pattern, count=100)
-            if keys:
-                target_client.delete(*keys)
-                print(f"Deleted {len(keys)} keys matching pattern {pattern}")
-            if cursor == 0:
-                break
+        router = ShardRouter(target_client)
+        try:
+            for node in router.nodes():
+                node_client = router.client_for_node(node)
+                cursor = 0
+                while True:
+                    cursor, keys = node_client.scan(cursor, match=pattern, count=100)
+                    if keys:
+                        write_grouped(router, [(key, None) for key in keys],
+                                      lambda pipe, key, _: pipe.delete(key))
+                        print(f"Deleted {len(keys)} keys matching pattern {pattern}")
+                    if cursor == 0:
+                        break
+        finally:
+            router.close()
         print("Target database cleanup completed")
     except Exception as e:
         print(f"Error during target database cleanup: {e}")
         raise
 
-def recreate_index(target_client, index_info, index_name):
-    """Recreate the index in target database with the same schema as source"""
+# Map FT.INFO vector data types to the NumPy dtype of the stored blobs
+VECTOR_DTYPES = {
+    "FLOAT16": np.float16,
+    "FLOAT32": np.float32,
+    "FLOAT64": np.float64,
+    "INT8": np.int8,
+    "UINT8": np.uint8,
+}
+
+def get_binary_client(client):
+    """Return a client on the same connection that leaves replies as raw bytes (needed for vector blobs)"""
+    return clone_client(client, decode_responses=False)
+
+def get_index_prefix(index_info):
+    """Return the first key prefix of an index definition, or None if it has none"""
+    index_def = index_info["index_definition"]
+    for i in range(0, len(index_def), 2):
+        if index_def[i] == "prefixes" and isinstance(index_def[i + 1], list) and len(index_def[i + 1]) > 0:
+            return index_def[i + 1][0]  # Take the first prefix
+    return None
+
+def parse_attribute(field):
+    """Convert an FT.INFO attribute list into a dictionary with lower-cased keys"""
+    return {str(field[i]).lower(): field[i + 1] for i in range(0, len(field), 2)}
+
+def get_vector_fields(index_info):
+    """Return the VECTOR attributes of an index as dictionaries with lower-cased FT.INFO keys"""
+    vector_fields = []
+    for field in index_info["attributes"]:
+        field_dict = parse_attribute(field)
+        if field_dict.get("type", "") == "VECTOR":
+            vector_fields.append(field_dict)
+    return vector_fields
+
+def vector_field_attrs(field_dict, vector_params=None):
+    """Build RedisVL vector attrs from an FT.INFO vector attribute, applying optional overrides.
+
+    vector_params may set algorithm, m, ef_construction and ef_runtime, e.g. the
+    settings recommended by hnsw_advisor.py.
+    """
+    attrs = {
+        "algorithm": field_dict.get("algorithm", "FLAT"),
+        "dims": int(field_dict.get("dim", 3)),
+        "distance_metric": field_dict.get("distance_metric", "COSINE"),
+        "type": field_dict.get("data_type", "FLOAT32")
+    }
+    # Keep the HNSW graph parameters of the source instead of silently resetting them to defaults
+    if str(attrs["algorithm"]).upper() == "HNSW":
+        for key in ("m", "ef_construction", "ef_runtime"):
+            if key in field_dict:
+                attrs[key] = int(field_dict[key])
+    if vector_params:
+        attrs.update(vector_params)
+    return attrs
+
+def recreate_index(target_client, index_info, index_name, vector_params=None):
+    """Recreate the index in target database with the same schema as source
+
+    vector_params optionally overrides the vector algorithm parameters, keyed by
+    vector field name (e.g. {"embedding": {"algorithm": "HNSW", "m": 32}}).
+    """
+    vector_params = vector_params or {}
     fields = []
     for field in index_info["attributes"]:
         # Convert field list to dictionary
-        field_dict = {field[i]: field[i + 1] for i in range(0, len(field), 2)}
+        field_dict = parse_attribute(field)
         field_name = field_dict.get("attribute", "")
         field_type = field_dict.get("type", "")
         
@@ -60,22 +144,11 @@ def recreate_index(target_client, index_info, index_name):
             fields.append({
                 "name": field_name,
                 "type": "vector",
-                "attrs": {
-                    "algorithm": field_dict.get("algorithm", "FLAT"),
-                    "dims": int(field_dict.get("dim", 3)),
-                    "distance_metric": field_dict.get("distance_metric", "COSINE"),
-                    "type": field_dict.get("data_type", "FLOAT32")
-                }
+                "attrs": vector_field_attrs(field_dict, vector_params.get(field_name))
             })
 
     # Extract prefix from index definition
-    index_def = index_info["index_definition"]
-    prefix = None
-    for i in range(0, len(index_def), 2):
-        if index_def[i] == "prefixes" and isinstance(index_def[i + 1], list) and len(index_def[i + 1]) > 0:
-            prefix = index_def[i + 1][0]  # Take the first prefix
-            break
-    
+    prefix = get_index_prefix(index_info)
     if not prefix:
         raise Exception("No prefix found in index definition")
 
@@ -131,32 +204,194 @@ def run_riot_replication(source_client, target_client, key_pattern):
         print(f"Error during RIOT replication: {e}")
         raise
 
-def run_migration(source_client, target_client, index_name):
-    """Main migration process that orchestrates the entire workflow"""
+def copy_keys(source_client, target_router, keys, big_key_bytes=1024 * 1024):
+    """Copy a batch of keys with DUMP/RESTORE, writing with one pipeline per target shard
+
+    Keys whose estimated size exceeds big_key_bytes are not dumped, so a single
+    oversized document cannot stall the batch; they are returned for copy_big_key.
+    """
+    # Size the keys up front, MEMORY USAGE is cheap compared to serializing a big key
+    pipe = source_client.pipeline(transaction=False)
+    for key in keys:
+        pipe.memory_usage(key)
+    sizes = pipe.execute(raise_on_error=False)
+    big_keys = [key for key, size in zip(keys, sizes) if isinstance(size, int) and size > big_key_bytes]
+    small_keys = [key for key, size in zip(keys, sizes) if not (isinstance(size, int) and size > big_key_bytes)]
+
+    pipe = source_client.pipeline(transaction=False)
+    for key in small_keys:
+        pipe.pttl(key)
+        pipe.dump(key)
+    results = pipe.execute()
+
+    items = []
+    for key, ttl, payload in zip(small_keys, results[0::2], results[1::2]):
+        if payload is None:
+            continue  # Key expired or was deleted since the scan
+        items.append((key, (max(ttl, 0), payload)))
+
+    write_grouped(target_router, items,
+                  lambda pipe, key, value: pipe.restore(key, value[0], value[1], replace=True))
+    return len(items), big_keys
+
+def _copy_hash_in_chunks(source_client, target_client, key, temp_key, chunk_bytes):
+    """Rebuild a hash under temp_key with HSCAN and chunked HSET, then rename it over key"""
+    target_client.delete(temp_key)
+    chunk = {}
+    chunk_size = 0
+    fields = 0
+    for field, value in source_client.hscan_iter(key, count=100):
+        chunk[field] = value
+        chunk_size += len(field) + len(value)
+        if chunk_size >= chunk_bytes:
+            target_client.hset(temp_key, mapping=chunk)
+            fields += len(chunk)
+            chunk = {}
+            chunk_size = 0
+    if chunk:
+        target_client.hset(temp_key, mapping=chunk)
+        fields += len(chunk)
+
+    if fields == 0:
+        return False  # Key was deleted since the scan
+
+    # Swap the finished copy into place atomically, so the index never sees a partial document
+    ttl = source_client.pttl(key)
+    pipe = target_client.pipeline(transaction=True)
+    pipe.rename(temp_key, key)
+    if ttl > 0:
+        pipe.pexpire(key, ttl)
+    pipe.execute()
+    return True
+
+def copy_big_key(source_client, target_router, key, chunk_bytes=256 * 1024, max_attempts=5):
+    """Copy one oversized key on its own
+
+    Hashes are rebuilt field by field in a temporary key on the same hash slot and
+    renamed into place; other types, and keys that cannot get a same-slot temporary
+    key, fall back to a single DUMP/RESTORE.
+    """
+    if source_client.type(key) in (b"hash", "hash"):
+        try:
+            temp_key = slot_local_key(key, "__migrate_tmp")
+        except ValueError:
+            temp_key = None
+
+        if temp_key is not None:
+            node = target_router.node_for_key(key)
+            for attempt in range(max_attempts):
+                try:
+                    return _copy_hash_in_chunks(source_client, target_router.client_for_node(node), key, temp_key,
+                                                chunk_bytes)
+                except MovedError as e:
+                    # The slot has a new owner, go there directly
+                    print(f"Big key {key!r} moved to {e.host}:{e.port}, retrying")
+                    node = (e.host, int(e.port))
+                    target_router.refresh()
+                except TOPOLOGY_ERRORS as e:
+                    # ASK (slot mid-migration), TRYAGAIN, CLUSTERDOWN or a lost connection: wait for the cluster to settle
+                    print(f"Slot map changing while copying big key {key!r}, retrying "
+                          f"(attempt {attempt + 1}/{max_attempts}): {e}")
+                    time.sleep(0.1 * (2 ** attempt))
+                    target_router.refresh()
+                    node = target_router.node_for_key(key)
+            raise Exception(f"Failed to copy big key {key!r} after {max_attempts} attempts")
+
+    ttl = source_client.pttl(key)
+    payload = source_client.dump(key)
+    if payload is None:
+        return False
+    write_grouped(target_router, [(key, (max(ttl, 0), payload))],
+                  lambda pipe, key, value: pipe.restore(key, value[0], value[1], replace=True))
+    return True
+
+def run_pipelined_replication(source_client, target_client, key_pattern, batch_size=500,
+                              big_key_bytes=1024 * 1024, chunk_bytes=256 * 1024):
+    """Migrate data in-process with pipelined DUMP/RESTORE, batching writes by target shard.
+
+    An alternative to RIOT that computes the hash slot of each key and keeps one
+    pipeline per owning shard of a clustered target, refreshing the slot map on
+    MOVED/ASK replies instead of failing. Keys larger than big_key_bytes are set
+    aside and copied afterwards in chunks of chunk_bytes (see copy_big_key).
+    """
+    # DUMP payloads are binary, so both sides need clients that do not decode replies
+    binary_source = get_binary_client(source_client)
+    binary_target = get_binary_client(target_client)
+    source_router = ShardRouter(binary_source)
+    target_router = ShardRouter(binary_target)
+
+    try:
+        print(f"Starting pipelined replication ({len(target_router.nodes())} target shard(s))...")
+        copied = 0
+        big_keys = []
+        for node in source_router.nodes():
+            node_client = source_router.client_for_node(node)
+            cursor = 0
+            while True:
+                cursor, keys = node_client.scan(cursor, match=key_pattern, count=batch_size)
+                if keys:
+                    batch_copied, batch_big_keys = copy_keys(node_client, target_router, keys, big_key_bytes)
+                    copied += batch_copied
+                    big_keys.extend((node, key) for key in batch_big_keys)
+                    print(f"Copied {copied} keys matching pattern {key_pattern}")
+                if cursor == 0:
+                    break
+
+        if big_keys:
+            print(f"Copying {len(big_keys)} big keys (> {big_key_bytes} bytes) in chunks...")
+        for node, key in big_keys:
+            if copy_big_key(source_router.client_for_node(node), target_router, key, chunk_bytes):
+                copied += 1
+        print(f"Pipelined replication completed successfully ({copied} keys)")
+
+    except Exception as e:
+        print(f"Error during pipelined replication: {e}")
+        raise
+    finally:
+        source_router.close()
+        target_router.close()
+        binary_source.close()
+        binary_target.close()
+
+def run_migration(source_client, target_client, index_name, vector_params=None, replication="riot", timings=None):
+    """Main migration process that orchestrates the entire workflow
+
+    vector_params is passed to recreate_index to retune vector fields on the target.
+    replication selects the data copy: "riot" (default) or "pipeline" for
+    run_pipelined_replication, which batches writes by hash slot on clustered targets.
+    If a timings dictionary is given, the duration of each stage in seconds is stored in it.
+    """
+    timings = {} if timings is None else timings
     try:
         # Get index information from source
+        start_time = time.perf_counter()
         index_info = get_index_definition(source_client, index_name)
         if not index_info:
             raise Exception("Failed to retrieve index definition")
+        timings["get_index_definition"] = time.perf_counter() - start_time
 
         # Extract prefix from source index definition
-        prefix = None
-        for i in range(0, len(index_info["index_definition"]), 2):
-            if index_info["index_definition"][i] == "prefixes" and isinstance(index_info["index_definition"][i + 1], list) and len(index_info["index_definition"][i + 1]) > 0:
-                prefix = index_info["index_definition"][i + 1][0]  # Take the first prefix
-                break
-
+        prefix = get_index_prefix(index_info)
         if not prefix:
             raise Exception("No prefix found in index definition")
 
         # 1. Clean up target database
+        start_time = time.perf_counter()
         cleanup_target_database(target_client, index_name, prefix)
+        timings["cleanup_target_database"] = time.perf_counter() - start_time
 
         # 2. Create new index in target database
-        prefix = recreate_index(target_client, index_info, index_name)
+        start_time = time.perf_counter()
+        prefix = recreate_index(target_client, index_info, index_name, vector_params)
+        timings["recreate_index"] = time.perf_counter() - start_time
 
-        # 3. Migrate data using RIOT replication
-        run_riot_replication(source_client, target_client, f"{prefix}*")
+        # 3. Migrate data using RIOT or pipelined replication
+        start_time = time.perf_counter()
+        if replication == "pipeline":
+            run_pipelined_replication(source_client, target_client, f"{prefix}*")
+        else:
+            run_riot_replication(source_client, target_client, f"{prefix}*")
+        timings["replication"] = time.perf_counter() - start_time
 
         print("Migration completed successfully!")
         return True
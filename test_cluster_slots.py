@@ -0,0 +1,209 @@
+import fakeredis
+import pytest
+import redis
+from redis.exceptions import AskError, MovedError, TryAgainError
+
+import cluster_slots
+from cluster_slots import ShardRouter, _execute_group, hash_slot, slot_local_key, write_grouped
+
+NODE_A = ("10.0.0.1", 7000)
+NODE_B = ("10.0.0.2", 7000)
+
+class FakeCluster:
+    """Two fake shards whose replies can be overridden per command to simulate redirects."""
+
+    def __init__(self):
+        self.nodes = {node: FakeNode(self, node) for node in (NODE_A, NODE_B)}
+        self.slot_map = [(0, 8191, NODE_A), (8192, 16383, NODE_B)]
+        self.refreshes = 0
+        self.commands = []  # (node, args, asking) for every command that reached a node
+        self.rule = lambda node, args, asking: None
+
+    def reply_for(self, node, args, asking):
+        self.commands.append((node, args, asking))
+        return self.rule(node, args, asking)
+
+class FakeNode:
+    def __init__(self, cluster, address):
+        self.cluster = cluster
+        self.address = address
+        self.db = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+    def close(self):
+        pass
+
+class FakePipeline:
+    """Records commands like a redis-py pipeline and replays them against the node's fake database."""
+
+    def __init__(self, node):
+        self.node = node
+        self.command_stack = []
+
+    def execute_command(self, *args, **options):
+        self.command_stack.append((args, options))
+        return self
+
+    def set(self, key, value):
+        return self.execute_command('SET', key, value)
+
+    def rename(self, src, dst):
+        return self.execute_command('RENAME', src, dst)
+
+    def execute(self, raise_on_error=True):
+        results = []
+        asking = False
+        for args, _ in self.command_stack:
+            if args[0] == 'ASKING':
+                asking = True
+                results.append(b'OK')
+                continue
+            error = self.node.cluster.reply_for(self.node.address, args, asking)
+            asking = False
+            if error is not None:
+                results.append(error)
+                continue
+            try:
+                results.append(self.node.db.execute_command(*args))
+            except redis.ResponseError as e:
+                results.append(e)
+        return results
+
+@pytest.fixture
+def cluster(monkeypatch):
+    fake_cluster = FakeCluster()
+
+    def get_slot_map(client):
+        fake_cluster.refreshes += 1
+        return fake_cluster.slot_map
+
+    monkeypatch.setattr(cluster_slots, "get_slot_map", get_slot_map)
+    monkeypatch.setattr(cluster_slots, "clone_client", lambda client, host, port: fake_cluster.nodes[(host, port)])
+    monkeypatch.setattr(cluster_slots.time, "sleep", lambda seconds: None)
+    return fake_cluster
+
+@pytest.fixture
+def router(cluster):
+    shard_router = ShardRouter(cluster.nodes[NODE_A])
+    yield shard_router
+    shard_router.close()
+
+def key_on(node, prefix="key"):
+    """Return a key whose slot is owned by node in the default FakeCluster slot map."""
+    for i in range(1000):
+        key = f"{prefix}:{i}"
+        if (hash_slot(key) <= 8191) == (node == NODE_A):
+            return key
+    raise AssertionError("no key found")
+
+def set_value(pipe, key, value):
+    pipe.set(key, value)
+
+def test_hash_slot_honours_hash_tags():
+    assert hash_slot("{user1}:profile") == hash_slot("user1")
+    assert hash_slot(b"{user1}:profile") == hash_slot("{user1}:orders")
+
+@pytest.mark.parametrize("key", ["doc:1", "{tenant}:doc:1", b"vector:doc:42", "doc:{1"])
+def test_slot_local_key_keeps_the_slot(key):
+    local_key = slot_local_key(key, "__migrate_tmp")
+    assert local_key.startswith(b"__migrate_tmp:{")
+    assert hash_slot(local_key) == hash_slot(key)
+
+def test_slot_local_key_is_unique_per_key():
+    assert slot_local_key("{t}:a", "ns") != slot_local_key("{t}:b", "ns")
+
+@pytest.mark.parametrize("key", ["x}y", "a{}b"])
+def test_slot_local_key_rejects_untagged_key_with_closing_brace(key):
+    with pytest.raises(ValueError):
+        slot_local_key(key, "ns")
+
+def test_group_by_node_splits_by_slot_owner(router):
+    key_a, key_b = key_on(NODE_A), key_on(NODE_B)
+    groups = router.group_by_node([(key_a, 1), (key_b, 2), ("{" + key_a + "}:other", 3)])
+    assert groups == {NODE_A: [(key_a, 1), ("{" + key_a + "}:other", 3)], NODE_B: [(key_b, 2)]}
+    assert router.nodes() == [NODE_A, NODE_B]
+
+def test_group_by_node_standalone_uses_one_group(monkeypatch):
+    monkeypatch.setattr(cluster_slots, "get_slot_map", lambda client: None)
+    standalone = ShardRouter(fakeredis.FakeRedis())
+    assert standalone.nodes() == [None]
+    assert standalone.group_by_node([("a", 1), ("b", 2)]) == {None: [("a", 1), ("b", 2)]}
+
+def test_write_grouped_writes_each_key_on_its_shard(cluster, router):
+    key_a, key_b = key_on(NODE_A), key_on(NODE_B)
+    assert write_grouped(router, [(key_a, "1"), (key_b, "2")], set_value) == []
+    assert cluster.nodes[NODE_A].db.get(key_a) == b"1"
+    assert cluster.nodes[NODE_B].db.get(key_b) == b"2"
+
+def test_execute_group_pairs_replies_with_asking(cluster):
+    node = cluster.nodes[NODE_B]
+
+    def write_twice(pipe, key, value):
+        pipe.set(key, value)
+        pipe.set(key + ":copy", value)
+
+    retry, skipped = _execute_group(node, [("a", "1"), ("b", "2")], write_twice, asking=True)
+    assert (retry, skipped) == ([], [])
+    assert all(asking for _, _, asking in cluster.commands)
+    assert node.db.get("b:copy") == b"2"
+
+def test_execute_group_returns_redirected_items(cluster):
+    moved = MovedError(f"1 {NODE_B[0]}:{NODE_B[1]}")
+    cluster.rule = lambda node, args, asking: moved if args[1] == "b" else None
+    retry, skipped = _execute_group(cluster.nodes[NODE_A], [("a", "1"), ("b", "2")], set_value)
+    assert retry == [(("b", "2"), moved)]
+    assert skipped == []
+
+def test_write_grouped_follows_moved_to_the_new_owner(cluster, router):
+    key = key_on(NODE_A)
+    # The slot moved to B, but CLUSTER SLOTS still names A
+    cluster.rule = lambda node, args, asking: (
+        MovedError(f"{hash_slot(key)} {NODE_B[0]}:{NODE_B[1]}") if node == NODE_A else None
+    )
+    refreshes = cluster.refreshes
+    write_grouped(router, [(key, "1")], set_value)
+    assert cluster.nodes[NODE_B].db.get(key) == b"1"
+    assert cluster.refreshes > refreshes
+
+def test_write_grouped_sends_asking_to_the_importing_node(cluster, router):
+    key = key_on(NODE_A)
+    ask = f"{hash_slot(key)} {NODE_B[0]}:{NODE_B[1]}"
+    # A is migrating the slot and B only accepts it after ASKING; the slot map never changes
+    cluster.rule = lambda node, args, asking: AskError(ask) if node == NODE_A or not asking else None
+    write_grouped(router, [(key, "1")], set_value)
+    assert cluster.nodes[NODE_B].db.get(key) == b"1"
+    assert (NODE_B, ("SET", key, "1"), True) in cluster.commands
+
+def test_write_grouped_retries_tryagain(cluster, router):
+    key = key_on(NODE_A)
+    attempts = []
+
+    def try_again_twice(node, args, asking):
+        attempts.append(node)
+        return TryAgainError("Multiple keys request during rehashing of slot") if len(attempts) <= 2 else None
+
+    cluster.rule = try_again_twice
+    write_grouped(router, [(key, "1")], set_value)
+    assert cluster.nodes[NODE_A].db.get(key) == b"1"
+    assert len(attempts) == 3
+
+def test_write_grouped_gives_up_after_max_attempts(cluster, router):
+    cluster.rule = lambda node, args, asking: TryAgainError("still rehashing")
+    with pytest.raises(Exception, match="Failed to write 1 keys after 3 attempts"):
+        write_grouped(router, [(key_on(NODE_A), "1")], set_value, max_attempts=3)
+
+def test_write_grouped_returns_ignored_items(cluster, router):
+    key_a, missing = key_on(NODE_A), key_on(NODE_A, "missing")
+    cluster.nodes[NODE_A].db.set(key_a, "1")
+    items = [(key_a, slot_local_key(key_a, "ns")), (missing, slot_local_key(missing, "ns"))]
+    skipped = write_grouped(router, items, lambda pipe, key, new_key: pipe.rename(key, new_key),
+                            ignore_error=lambda e: "no such key" in str(e).lower())
+    assert skipped == [items[1]]
+    assert cluster.nodes[NODE_A].db.exists(slot_local_key(key_a, "ns"))
+
+def test_write_grouped_raises_other_errors(cluster, router):
+    missing = key_on(NODE_A, "missing")
+    with pytest.raises(redis.ResponseError):
+        write_grouped(router, [(missing, b"ns:" + missing.encode())], lambda pipe, key, new_key: pipe.rename(key, new_key))
@@ -0,0 +1,331 @@
+import argparse
+import hashlib
+import json
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+import redis
+
+from cluster_slots import ShardRouter, read_grouped, slot_local_key, write_grouped
+from migrate_index_redisvl import (
+    VECTOR_DTYPES,
+    get_binary_client,
+    get_index_definition,
+    get_index_prefix,
+    get_vector_fields,
+)
+
+# Problems reported by validate_vectors, in report order
+ISSUES = ("missing", "wrong_type", "wrong_size", "non_finite", "zero_norm", "duplicate")
+
+# Issues that are only reported: a missing vector may be an optional field,
+# duplicates are as good as their first copy, and non-hash keys under the
+# prefix may belong to something else
+REPORT_ONLY_ISSUES = ("missing", "wrong_type", "duplicate")
+
+def get_redis_connection(host: str, port: int) -> redis.Redis:
+    """Create and return a Redis connection."""
+    return redis.Redis(
+        host=host,
+        port=port,
+        decode_responses=True
+    )
+
+def get_vector_field(client: redis.Redis, index_name: str, field_name: str = None) -> Tuple[str, Dict[str, Any]]:
+    """Return the key prefix and the FT.INFO attributes of a vector field of an index."""
+    index_info = get_index_definition(client, index_name)
+    if not index_info:
+        raise Exception("Failed to retrieve index definition")
+    prefix = get_index_prefix(index_info)
+    if not prefix:
+        raise Exception("No prefix found in index definition")
+
+    vector_fields = get_vector_fields(index_info)
+    if field_name:
+        vector_fields = [f for f in vector_fields if f.get("attribute") == field_name]
+    if not vector_fields:
+        raise Exception(f"No vector field {field_name or ''} found in index {index_name}")
+
+    field = vector_fields[0]
+    data_type = str(field.get("data_type", "FLOAT32")).upper()
+    if data_type not in VECTOR_DTYPES:
+        raise Exception(f"Unsupported vector data type {data_type}")
+    return prefix, field
+
+def is_wrong_type(reply: Any) -> bool:
+    """Return True for the error reply of a hash command sent to a key of another type."""
+    return isinstance(reply, redis.ResponseError) and str(reply).startswith("WRONGTYPE")
+
+def stream_vectors(router: ShardRouter, prefix: str, field_name: str,
+                   batch_size: int = 500) -> Iterator[Tuple[List[bytes], List[Any]]]:
+    """Yield (keys, blobs) batches of a vector field for every document under prefix, shard by shard.
+
+    Keys under the prefix that are not hashes yield their WRONGTYPE error instead of a blob.
+    """
+    for node in router.nodes():
+        node_client = router.client_for_node(node)
+        cursor = 0
+        while True:
+            cursor, keys = node_client.scan(cursor, match=f"{prefix}*", count=batch_size)
+            if keys:
+                pipe = node_client.pipeline(transaction=False)
+                for key in keys:
+                    pipe.hget(key, field_name)
+                blobs = pipe.execute(raise_on_error=False)
+                for blob in blobs:
+                    if isinstance(blob, Exception) and not is_wrong_type(blob):
+                        raise blob
+                yield keys, blobs
+            if cursor == 0:
+                break
+
+def decode_vectors(blobs: List[bytes], dims: int, dtype: Any) -> Tuple[np.ndarray, np.ndarray]:
+    """Decode the well-sized blobs into a (n, dims) float64 array and return it with their row mask."""
+    expected_size = dims * np.dtype(dtype).itemsize
+    sizes = np.array([len(blob) if isinstance(blob, bytes) else -1 for blob in blobs])
+    well_sized = sizes == expected_size
+    joined = b"".join(blob for blob, ok in zip(blobs, well_sized) if ok)
+    vectors = np.frombuffer(joined, dtype=dtype).reshape(-1, dims).astype(np.float64)
+    return vectors, well_sized
+
+def validate_vectors(keys: List[bytes], blobs: List[bytes], field: Dict[str, Any],
+                     seen: Optional[Set[bytes]] = None) -> Dict[str, List[bytes]]:
+    """Check a batch of blobs against the FT.INFO vector attributes and return the bad keys by issue.
+
+    seen holds a 16 byte digest of every distinct blob checked so far, so exact
+    duplicates are found across batches (about 80 MB per million vectors). Pass
+    None to skip the duplicate check.
+    """
+    dims = int(field.get("dim", 0))
+    dtype = VECTOR_DTYPES[str(field.get("data_type", "FLOAT32")).upper()]
+    issues = {issue: [] for issue in ISSUES}
+
+    sizes_known = np.array([isinstance(blob, bytes) for blob in blobs])
+    wrong_type = np.array([is_wrong_type(blob) for blob in blobs])
+    vectors, well_sized = decode_vectors(blobs, dims, dtype)
+    keys = np.array(keys, dtype=object)
+    issues["missing"] = keys[~sizes_known & ~wrong_type].tolist()
+    issues["wrong_type"] = keys[wrong_type].tolist()
+    issues["wrong_size"] = keys[sizes_known & ~well_sized].tolist()
+
+    sized_keys = keys[well_sized]
+    finite = np.isfinite(vectors).all(axis=1)
+    issues["non_finite"] = sized_keys[~finite].tolist()
+    if str(field.get("distance_metric", "")).upper() == "COSINE":
+        # A zero vector has no direction, its cosine distance to anything is undefined
+        zero_norm = finite & (np.linalg.norm(np.where(np.isfinite(vectors), vectors, 0), axis=1) == 0)
+        issues["zero_norm"] = sized_keys[zero_norm].tolist()
+
+    if seen is None:
+        return issues
+    for key, blob, ok in zip(keys, blobs, well_sized):
+        if not ok:
+            continue
+        digest = hashlib.blake2b(blob, digest_size=16).digest()
+        if digest in seen:
+            issues["duplicate"].append(key)
+        else:
+            seen.add(digest)
+    return issues
+
+def quarantine_keys(router: ShardRouter, keys: List[bytes], index_name: str) -> int:
+    """Rename bad documents out of the index prefix into a same-slot __quarantine key and return how many moved.
+
+    Keys deleted since the scan are skipped.
+    """
+    items = []
+    for key in keys:
+        try:
+            items.append((key, slot_local_key(key, f"__quarantine:{index_name}")))
+        except ValueError as e:
+            print(f"Not quarantining {key!r}: {e}")
+    skipped = write_grouped(router, items, lambda pipe, key, quarantine_key: pipe.rename(key, quarantine_key),
+                            ignore_error=lambda e: "no such key" in str(e).lower())
+    return len(items) - len(skipped)
+
+def scan_index(client: redis.Redis, index_name: str, field_name: str = None, batch_size: int = 500,
+               quarantine: bool = False, duplicates: bool = True) -> Dict[str, Any]:
+    """Validate every embedding of an index and optionally quarantine the bad documents.
+
+    With duplicates=False exact duplicates are not looked for, which saves the
+    digest set that otherwise grows with the number of distinct vectors.
+    """
+    prefix, field = get_vector_field(client, index_name, field_name)
+    binary_client = get_binary_client(client)
+    router = ShardRouter(binary_client)
+    report = {issue: [] for issue in ISSUES}
+    scanned = 0
+    seen = set() if duplicates else None
+
+    try:
+        for keys, blobs in stream_vectors(router, prefix, field["attribute"], batch_size):
+            scanned += len(keys)
+            for issue, bad_keys in validate_vectors(keys, blobs, field, seen).items():
+                report[issue].extend(bad_keys)
+
+        quarantined = 0
+        if quarantine:
+            bad_keys = sorted({key for issue in ISSUES if issue not in REPORT_ONLY_ISSUES for key in report[issue]})
+            quarantined = quarantine_keys(router, bad_keys, index_name)
+    finally:
+        router.close()
+        binary_client.close()
+
+    return {
+        "index": index_name,
+        "field": field["attribute"],
+        "scanned": scanned,
+        "issues": {issue: [key.decode(errors="replace") for key in report[issue]] for issue in ISSUES},
+        "quarantined": quarantined,
+    }
+
+def compare_vectors(source_client: redis.Redis, target_client: redis.Redis, index_name: str,
+                    field_name: str = None, batch_size: int = 500,
+                    rtol: float = 1e-3, atol: float = 1e-6) -> Dict[str, Any]:
+    """Compare the embeddings of every source document with its copy on the target.
+
+    Blobs must match byte for byte when both indexes store the same data type; after
+    a type conversion the decoded values must match within rtol/atol instead.
+    """
+    prefix, source_field = get_vector_field(source_client, index_name, field_name)
+    _, target_field = get_vector_field(target_client, index_name, source_field["attribute"])
+    dims = int(source_field.get("dim", 0))
+    source_type = str(source_field.get("data_type", "FLOAT32")).upper()
+    target_type = str(target_field.get("data_type", "FLOAT32")).upper()
+    converted = source_type != target_type
+
+    binary_source = get_binary_client(source_client)
+    binary_target = get_binary_client(target_client)
+    source_router = ShardRouter(binary_source)
+    target_router = ShardRouter(binary_target)
+    report = {"missing_in_target": [], "wrong_type_in_target": [], "wrong_size_in_target": [], "mismatched": []}
+    compared = 0
+    max_abs_diff = 0.0
+
+    try:
+        for keys, source_blobs in stream_vectors(source_router, prefix, source_field["attribute"], batch_size):
+            target_replies = read_grouped(target_router, keys,
+                                          lambda pipe, key: pipe.hget(key, source_field["attribute"]))
+            # Source keys without a vector or of another type are covered by scan_index
+            pairs = [(key, blob, target_replies[key]) for key, blob in zip(keys, source_blobs)
+                     if isinstance(blob, bytes)]
+            for key, _, target_blob in pairs:
+                if isinstance(target_blob, Exception) and not is_wrong_type(target_blob):
+                    raise target_blob
+            report["missing_in_target"].extend(key for key, _, target_blob in pairs if target_blob is None)
+            report["wrong_type_in_target"].extend(key for key, _, target_blob in pairs if is_wrong_type(target_blob))
+            pairs = [pair for pair in pairs if isinstance(pair[2], bytes)]
+            compared += len(pairs)
+
+            if not converted:
+                report["mismatched"].extend(key for key, source_blob, target_blob in pairs
+                                            if source_blob != target_blob)
+                continue
+
+            source_vectors, source_ok = decode_vectors([p[1] for p in pairs], dims, VECTOR_DTYPES[source_type])
+            target_vectors, target_ok = decode_vectors([p[2] for p in pairs], dims, VECTOR_DTYPES[target_type])
+            report["wrong_size_in_target"].extend(p[0] for p, ok in zip(pairs, target_ok) if not ok)
+            # Only rows that decoded on both sides can be compared numerically
+            both_ok = source_ok & target_ok
+            source_vectors = source_vectors[both_ok[source_ok]]
+            target_vectors = target_vectors[both_ok[target_ok]]
+            both_keys = [p[0] for p, ok in zip(pairs, both_ok) if ok]
+            if both_keys:
+                close = np.isclose(target_vectors, source_vectors, rtol=rtol, atol=atol, equal_nan=True).all(axis=1)
+                report["mismatched"].extend(key for key, ok in zip(both_keys, close) if not ok)
+                diffs = np.abs(target_vectors - source_vectors)
+                if np.isfinite(diffs).any():
+                    max_abs_diff = max(max_abs_diff, float(np.nanmax(np.where(np.isfinite(diffs), diffs, np.nan))))
+    finally:
+        source_router.close()
+        target_router.close()
+        binary_source.close()
+        binary_target.close()
+
+    return {
+        "index": index_name,
+        "field": source_field["attribute"],
+        "source_type": source_type,
+        "target_type": target_type,
+        "compared": compared,
+        "max_abs_diff": max_abs_diff,
+        "issues": {issue: [key.decode(errors="replace") for key in keys] for issue, keys in report.items()},
+    }
+
+def print_issues(report: Dict[str, Any], max_keys: int) -> None:
+    """Print the number of keys per issue and the first max_keys of each."""
+    for issue, keys in report["issues"].items():
+        print(f"{issue}: {len(keys)}")
+        for key in keys[:max_keys]:
+            print(f"- {key}")
+        if len(keys) > max_keys:
+            print(f"... and {len(keys) - max_keys} more keys")
+
+def main():
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description='Scan the embeddings of a Redis vector index for data quality issues')
+    parser.add_argument('index_name', help='Name of the index to scan')
+    parser.add_argument('--field', help='Vector field to scan (defaults to the first vector field)')
+    parser.add_argument('--batch-size', type=int, default=500, help='Documents fetched per pipeline')
+    parser.add_argument('--target', action='store_true', help='Scan the target instead of the source')
+    parser.add_argument('--quarantine', action='store_true',
+                        help='Rename bad documents out of the index prefix into __quarantine:<index>:{...} keys')
+    parser.add_argument('--no-duplicates', action='store_true',
+                        help='Skip the duplicate check, which keeps a digest of every distinct vector in memory '
+                             '(about 80 MB per million documents)')
+    parser.add_argument('--compare', action='store_true', help='Also compare source and target embeddings')
+    parser.add_argument('--rtol', type=float, default=1e-3, help='Relative tolerance after a type conversion')
+    parser.add_argument('--atol', type=float, default=1e-6, help='Absolute tolerance after a type conversion')
+    parser.add_argument('--max-keys', type=int, default=10, help='Keys to print per issue')
+    parser.add_argument('--output', help='Write the full report to this JSON file')
+    args = parser.parse_args()
+
+    # Source Redis connection (your original cluster)
+    source_client = get_redis_connection(
+        host='node1.cluster-kmiller.ps-redis.com',
+        port=17120
+    )
+
+    # Target Redis connection (your new cluster)
+    target_client = get_redis_connection(
+        host='node1.cluster-kmiller.ps-redis.com',
+        port=12416
+    )
+
+    try:
+        scanned_client = target_client if args.target else source_client
+        print(f"Scanning {'target' if args.target else 'source'} index {args.index_name}...")
+        scan_report = scan_index(scanned_client, args.index_name, args.field, args.batch_size, args.quarantine,
+                                 not args.no_duplicates)
+
+        print("\nVector Quality Results:")
+        print("-" * 50)
+        print(f"Documents scanned: {scan_report['scanned']}")
+        print_issues(scan_report, args.max_keys)
+        if args.quarantine:
+            print(f"Documents quarantined: {scan_report['quarantined']}")
+
+        compare_report = None
+        if args.compare:
+            print("\nComparing source and target embeddings...")
+            compare_report = compare_vectors(source_client, target_client, args.index_name, args.field,
+                                             args.batch_size, args.rtol, args.atol)
+            print("\nVector Comparison Results:")
+            print("-" * 50)
+            print(f"Data type: {compare_report['source_type']} -> {compare_report['target_type']}")
+            print(f"Documents compared: {compare_report['compared']}")
+            print(f"Max absolute difference: {compare_report['max_abs_diff']:.3g}")
+            print_issues(compare_report, args.max_keys)
+
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump({"scan": scan_report, "compare": compare_report}, f, indent=2)
+            print(f"\nReport written to {args.output}")
+
+    finally:
+        # Close connections
+        source_client.close()
+        target_client.close()
+
+if __name__ == '__main__':
+    main()